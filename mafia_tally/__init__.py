@@ -1,10 +1,5 @@
 # from logging.config import dictConfig
 
-from flask import Flask
-
-from . import admin
-from . import tally
-
 '''
 dictConfig(
     {
@@ -26,6 +21,27 @@ dictConfig(
 )
 '''
 
-app = Flask(__name__)
-app.register_blueprint(tally.bp)
-app.register_blueprint(admin.bp)
+
+def create_app():
+    """
+    Create the Flask app.
+
+    Flask and the web modules are only imported here, so that the CLI tools
+    and anything else importing this package don't pay for them.
+    Game configs are loaded on first use.
+    """
+    from flask import Flask, render_template
+
+    from . import admin
+    from . import config
+    from . import tally
+
+    app = Flask(__name__)
+    app.register_blueprint(tally.bp)
+    app.register_blueprint(admin.bp)
+
+    @app.route('/')
+    def games():
+        return render_template('games.html', games=sorted(config.get_games()))
+
+    return app
@@ -1,3 +1,3 @@
-from mafia_tally import app
+from mafia_tally import create_app
 
-app.run()
+create_app().run()
@@ -1,35 +1,107 @@
 import json
 import logging
+from typing import AbstractSet, Dict, Optional
 
 import arrow
-from flask import Blueprint, render_template, request
+from flask import Blueprint, abort, g, render_template, request
 
-from . import config
+from . import cache, config
+from .config import GameConfig
+from .tallier import VotingRules
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 logger = logging.getLogger(__name__)
 
 
-@bp.route('/', methods=['GET', 'POST'])
+def parse_weights(text: str, players: AbstractSet[str]) -> Dict[str, int]:
+    """
+    Parse vote weights given as one 'Player Name: weight' per line.
+
+    Raises ValueError if a line doesn't name a player or its weight isn't a
+    whole number of votes.
+    """
+    weights = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        player, _, weight = line.rpartition(':')
+        player = player.strip()
+        weight = int(weight)
+        if player not in players:
+            raise ValueError('Not a player: {!r}'.format(player))
+        if weight < 0:
+            raise ValueError('Negative weight for {}: {}'.format(player, weight))
+        weights[player] = weight
+    return weights
+
+
+def parse_majority(text: str) -> Optional[int]:
+    """Parse the number of votes needed to hammer, if there is one."""
+    if not text.strip():
+        return None
+    majority = int(text)
+    if majority < 1:
+        raise ValueError('Majority must be at least 1: {}'.format(majority))
+    return majority
+
+
+def format_weights(weights: Dict[str, int]) -> str:
+    return '\n'.join(
+        '{}: {}'.format(player, weight)
+        for player, weight in sorted(weights.items())
+        if weight != 2
+    )
+
+
+@bp.url_value_preprocessor
+def pull_game(endpoint: str, values: dict):
+    if values is not None and 'game' in values:
+        g.game = config.get_game(values.pop('game'))
+        if g.game is None:
+            abort(404)
+
+
+@bp.route('/<game>/', methods=['GET', 'POST'])
 def admin():
+    game: GameConfig = g.game
     if request.method == 'GET':
-        return render_template('admin.html', config=config)
+        return render_template(
+            'admin.html', config=game, weights=format_weights(game.rules.weights)
+        )
 
     if config.check_admin_password(request.form['password']):
         post_id = int(request.form['post_id'])
         day_id = int(request.form['day_id'])
         cutoff = arrow.get(request.form['cutoff']).floor('second')
 
-        config.post_id = post_id
-        config.day_id = day_id
-        config.cutoff = cutoff.to('utc').isoformat()
-        config.save_day_config()
+        weights = dict.fromkeys(request.form.getlist('double'), 2)
+        try:
+            weights.update(parse_weights(request.form.get('weights', ''), game.players))
+        except ValueError:
+            return 'Invalid vote weights.'
+        try:
+            majority = parse_majority(request.form.get('majority', ''))
+        except ValueError:
+            return 'Invalid majority.'
+
+        game.post_id = post_id
+        game.day_id = day_id
+        game.cutoff = cutoff.to('utc').isoformat()
+        game.rules = VotingRules(
+            weights=weights,
+            unvotable=request.form.getlist('unvotable'),
+            locked=request.form.getlist('locked'),
+            majority=majority,
+        )
+        game.save_day_config()
+        # the rules may have changed, so let the tally be recalculated
+        cache.unfinalise_day(game)
 
         dead = request.form.getlist('dead')
         if dead:
             for player in dead:
-                config.players.remove(player)
-            config.save_players()
+                game.players.remove(player)
+            game.save_players()
 
         return 'Success!'
     else:
@@ -40,24 +112,36 @@ def admin():
 @bp.route('/reload')
 def reload():
     config.load()
+    # the reloaded config may change a frozen day's tally
+    for game in config.get_games().values():
+        cache.unfinalise_day(game)
     return 'Success!'
 
 
-@bp.route('/add-commenter', methods=['GET', 'POST'])
+@bp.route('/<game>/reload')
+def reload_game():
+    g.game.load()
+    cache.unfinalise_day(g.game)
+    return 'Success!'
+
+
+@bp.route('/<game>/add-commenter', methods=['GET', 'POST'])
 def add_commenter():
+    game: GameConfig = g.game
     if request.method == 'GET':
-        return render_template('add-commenter.html', players=config.players)
+        return render_template('add-commenter.html', players=game.players)
 
     if not config.check_admin_password(request.form['password']):
         logger.warning('Incorrect password: %s', request.form['password'])
         return 'Incorrect password.'
 
-    with open(config.get_path('commenters.json')) as f:
+    with open(game.get_path('commenters.json')) as f:
         commenters = json.load(f)
 
     commenters[request.form['comment_id']] = request.form['player_name']
 
-    with open(config.get_path('commenters.json'), 'w') as f:
+    with open(game.get_path('commenters.json'), 'w') as f:
         json.dump(commenters, f)
+    cache.unfinalise_day(game)
 
     return 'Success!'
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-request cache staleness check.
+
+Compares the arrow-based check that used to run on every request against
+the numeric check on the pre-parsed cutoff. The arrow half is skipped if
+arrow isn't installed.
+
+Usage: python -m mafia_tally.bench_staleness [number]
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+
+from mafia_tally import cache
+from mafia_tally.config import GameConfig
+
+CUTOFF = '2030-01-01T00:00:00+00:00'
+
+
+def legacy_is_stale(path: str, cutoff: str) -> bool:
+    """
+    is_stale as it was before the cutoff was pre-parsed.
+
+    The original used now.replace(minutes=...), which arrow 0.14 dropped, so
+    this uses the equivalent now.shift(minutes=...) instead.
+    """
+    import arrow
+
+    now = arrow.utcnow().floor('second')
+
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return True
+    mtime = arrow.Arrow.utcfromtimestamp(mtime)
+
+    cutoff = arrow.get(cutoff)
+
+    return mtime < cutoff and mtime <= now.shift(minutes=-5 if now < cutoff else -1)
+
+
+def report(name: str, seconds: float, number: int) -> float:
+    per_call = seconds / number * 1e6
+    print('{0:<8} {1:>8.2f} µs/request'.format(name, per_call))
+    return per_call
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    game = GameConfig('bench')
+    game.day_id = 1
+    game.cutoff = CUTOFF
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache.cache_dir = tmp
+        cache.write_day_text(game, '')
+        path = cache.get_path(game, '1.txt')
+
+        seconds = timeit.timeit(lambda: cache.is_stale(game, '1.txt'), number=number)
+        after = report('numeric', seconds, number)
+
+        try:
+            import arrow  # noqa
+        except ImportError:
+            print('arrow is not installed, skipping the legacy check')
+            return
+
+        assert legacy_is_stale(path, CUTOFF) == cache.is_stale(game, '1.txt')
+        seconds = timeit.timeit(lambda: legacy_is_stale(path, CUTOFF), number=number)
+        before = report('arrow', seconds, number)
+
+    print('Speed-up: {:.1f}x'.format(before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,43 @@
-import functools
 import os
+import threading
+import time
+from typing import Dict
 
-import arrow
-
-from . import config
+from .config import GameConfig
 
 cache_dir = os.path.join(os.path.dirname(__file__), '..', 'cache')
 
+_refresh_locks: Dict[str, threading.Lock] = {}
+_refresh_locks_lock = threading.Lock()
+
+
+def get_dir(game: GameConfig) -> str:
+    return os.path.join(cache_dir, game.name)
 
-def get_path(filename: str) -> str:
-    return os.path.join(cache_dir, filename)
 
+def get_path(game: GameConfig, filename: str) -> str:
+    return os.path.join(get_dir(game), filename)
 
-@functools.wraps(open)
-def get_file(filename: str, *args, **kwargs):
-    return open(get_path(filename), *args, **kwargs)
 
+def get_file(game: GameConfig, filename: str, *args, **kwargs):
+    return open(get_path(game, filename), *args, **kwargs)
+
+
+def refresh_lock(game: GameConfig) -> threading.Lock:
+    """
+    Return the lock guarding refreshes of a game's cache.
 
-def is_stale(filename: str) -> bool:
+    Each game gets its own lock, so a slow refresh of one game only holds up
+    requests for that game.
+    """
+    try:
+        return _refresh_locks[game.name]
+    except KeyError:
+        with _refresh_locks_lock:
+            return _refresh_locks.setdefault(game.name, threading.Lock())
+
+
+def is_stale(game: GameConfig, filename: str) -> bool:
     """
     Return whether the current cached file is stale.
 
@@ -27,48 +47,70 @@ def is_stale(filename: str) -> bool:
     - the cutoff has passed and 1 minute has passed since the last update, or
     - 5 minutes have passed since the last update.
     """
-    now = arrow.utcnow().floor('second')
+    now = int(time.time())
 
     try:
-        mtime = os.stat(get_path(filename)).st_mtime
+        mtime = os.stat(get_path(game, filename)).st_mtime
     except FileNotFoundError:
         return True
-    mtime = arrow.Arrow.utcfromtimestamp(mtime)
 
-    cutoff = arrow.get(config.cutoff)
+    cutoff = game.cutoff_ts
+
+    return mtime < cutoff and mtime <= now - (300 if now < cutoff else 60)
 
-    return mtime < cutoff and mtime <= now.replace(minutes=-5 if now < cutoff else -1)
+
+def day_is_final(game: GameConfig) -> bool:
+    """Return whether the current day's cached tallies are frozen."""
+    return os.path.exists(get_path(game, '%d.final' % game.day_id))
+
+
+def finalise_day(game: GameConfig):
+    """
+    Freeze the current day's cached tallies.
+
+    Once a day is final, its cache is never stale, so nothing is fetched or
+    rendered for it again until the day is unfinalised.
+    """
+    write_cache(game, '%d.final' % game.day_id, '')
+
+
+def unfinalise_day(game: GameConfig):
+    try:
+        os.remove(get_path(game, '%d.final' % game.day_id))
+    except FileNotFoundError:
+        pass
 
 
-def day_html_is_stale() -> bool:
-    return is_stale('%d.html' % config.day_id)
+def day_html_is_stale(game: GameConfig) -> bool:
+    return not day_is_final(game) and is_stale(game, '%d.html' % game.day_id)
 
 
-def day_text_is_stale() -> bool:
-    return is_stale('%d.txt' % config.day_id)
+def day_text_is_stale(game: GameConfig) -> bool:
+    return not day_is_final(game) and is_stale(game, '%d.txt' % game.day_id)
 
 
-def read_cache(filename: str) -> str:
-    with get_file(filename) as f:
+def read_cache(game: GameConfig, filename: str) -> str:
+    with get_file(game, filename) as f:
         return f.read()
 
 
-def read_day_html() -> str:
-    return read_cache('%d.html' % config.day_id)
+def read_day_html(game: GameConfig) -> str:
+    return read_cache(game, '%d.html' % game.day_id)
 
 
-def read_day_text() -> str:
-    return read_cache('%d.txt' % config.day_id)
+def read_day_text(game: GameConfig) -> str:
+    return read_cache(game, '%d.txt' % game.day_id)
 
 
-def write_cache(filename: str, contents: str):
-    with get_file(filename, 'w') as f:
+def write_cache(game: GameConfig, filename: str, contents: str):
+    os.makedirs(get_dir(game), exist_ok=True)
+    with get_file(game, filename, 'w') as f:
         f.write(contents)
 
 
-def write_day_html(contents: str):
-    write_cache('%d.html' % config.day_id, contents)
+def write_day_html(game: GameConfig, contents: str):
+    write_cache(game, '%d.html' % game.day_id, contents)
 
 
-def write_day_text(contents: str):
-    write_cache('%d.txt' % config.day_id, contents)
+def write_day_text(game: GameConfig, contents: str):
+    write_cache(game, '%d.txt' % game.day_id, contents)
@@ -1,22 +1,19 @@
 import json
+import logging
 import os
-from typing import Dict, Set
+from typing import Dict, Optional, Set
 
-import werkzeug.security
+from .tallier import CompiledRules, VotingRules, parse_iso_timestamp
 
 config_dir = os.path.join(os.path.dirname(__file__), '..', 'config')
 get_path = lambda filename: os.path.join(config_dir, filename)
-day_config_file = get_path('day.json')
+games_dir = get_path('games')
 access_token_file = get_path('access_token.txt')
-players_file = get_path('players.txt')
 admin_passhash_file = get_path('passhash.txt')
 
-group_id: int = 328346913872436  # lol let's hardcode this
-post_id: int
-day_id: int
-cutoff: str
-players: Set[str]
-pics: Dict[str, str]
+DEFAULT_GROUP_ID = 328346913872436  # lol let's hardcode this
+
+logger = logging.getLogger(__name__)
 
 
 def get_access_token() -> str:
@@ -30,59 +27,158 @@ def get_passhash() -> str:
 
 
 def check_admin_password(password: str) -> bool:
-    return werkzeug.security.check_password_hash(get_passhash(), password)
-
-
-def load_day_config():
-    global post_id
-    global day_id
-    global cutoff
-
-    with open(day_config_file) as f:
-        day_info = json.load(f)
-
-    post_id = day_info['post_id']
-    day_id = day_info['day_id']
-    cutoff = day_info['cutoff']
-
-
-def get_players() -> Set[str]:
-    with open(players_file) as f:
-        return set(map(str.strip, f))
-
+    import werkzeug.security
 
-def load_players():
-    global players
-    players = get_players()
+    return werkzeug.security.check_password_hash(get_passhash(), password)
 
 
-def load_pics():
-    global pics
-    with open(get_path('pics.json')) as f:
-        pics = json.load(f)
+class GameConfig(object):
+    """
+    The configuration of a single game.
+
+    Each game lives in its own directory under config/games/, named after
+    the game, containing day.json, players.txt, pics.json, commenters.json
+    and optionally aliases.json.
+    """
+
+    name: str
+    group_id: int
+    post_id: int
+    day_id: int
+    cutoff_ts: int
+    players: Set[str]
+    pics: Dict[str, str]
+    aliases: Dict[str, str]
+    rules: VotingRules
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.group_id = DEFAULT_GROUP_ID
+        self.aliases = {}
+        self.rules = VotingRules()
+        self._compiled_rules = None
+
+    @property
+    def cutoff(self) -> str:
+        return self._cutoff
+
+    @cutoff.setter
+    def cutoff(self, cutoff: str):
+        # parse once here, so the hot paths only do numeric comparisons
+        self._cutoff = cutoff
+        self.cutoff_ts = parse_iso_timestamp(cutoff)
+
+    def get_path(self, filename: str) -> str:
+        return os.path.join(games_dir, self.name, filename)
+
+    def load_day_config(self):
+        with open(self.get_path('day.json')) as f:
+            day_info = json.load(f)
+
+        self.group_id = day_info.get('group_id', DEFAULT_GROUP_ID)
+        self.post_id = day_info['post_id']
+        self.day_id = day_info['day_id']
+        self.cutoff = day_info['cutoff']
+        self.rules = VotingRules.from_json(day_info.get('rules', {}))
+        self._compiled_rules = None
+
+    def get_compiled_rules(self) -> CompiledRules:
+        """Return the day's rules compiled against the current players."""
+        if self._compiled_rules is None:
+            self._compiled_rules = self.rules.compile(self.players, self.aliases)
+        return self._compiled_rules
+
+    def get_players(self) -> Set[str]:
+        with open(self.get_path('players.txt')) as f:
+            return set(map(str.strip, f))
+
+    def load_players(self):
+        self.players = self.get_players()
+        self._compiled_rules = None
+
+    def load_pics(self):
+        with open(self.get_path('pics.json')) as f:
+            self.pics = json.load(f)
+
+    def load_aliases(self):
+        """Load nicknames for players, used to work out untagged votes."""
+        try:
+            with open(self.get_path('aliases.json')) as f:
+                self.aliases = json.load(f)
+        except FileNotFoundError:
+            self.aliases = {}
+        self._compiled_rules = None
+
+    def load(self):
+        self.load_day_config()
+        self.load_players()
+        self.load_pics()
+        self.load_aliases()
+
+    def save_day_config(self):
+        self._compiled_rules = None
+        with open(self.get_path('day.json'), 'w') as f:
+            json.dump(
+                {
+                    'group_id': self.group_id,
+                    'post_id': self.post_id,
+                    'day_id': self.day_id,
+                    'cutoff': self.cutoff,
+                    'rules': self.rules.to_json(),
+                },
+                f,
+                indent='\t',
+            )
+
+    def save_players(self):
+        self._compiled_rules = None
+        with open(self.get_path('players.txt'), 'w') as f:
+            print(*self.players, sep='\n', file=f)
+
+    def save(self):
+        self.save_day_config()
+        self.save_players()
+
+
+games: Optional[Dict[str, GameConfig]] = None
+
+
+def get_games() -> Dict[str, GameConfig]:
+    """Return the game registry, loading it on first use."""
+    if games is None:
+        load()
+    return games
+
+
+def get_game(name: str) -> Optional[GameConfig]:
+    return get_games().get(name)
 
 
 def load():
-    load_day_config()
-    load_players()
-    load_pics()
-
-
-def save_day_config():
-    with open(day_config_file, 'w') as f:
-        json.dump(
-            {'post_id': post_id, 'day_id': day_id, 'cutoff': cutoff}, f, indent='\t'
-        )
-
-
-def save_players():
-    with open(players_file, 'w') as f:
-        print(*players, sep='\n', file=f)
-
-
-def save():
-    save_day_config()
-    save_players()
-
-
-load()
+    """
+    (Re)load the config of every game under config/games/.
+
+    A game whose config can't be loaded is logged and left out, so that it
+    doesn't take the other games down with it.
+    """
+    loaded = {}
+    try:
+        names = sorted(os.listdir(games_dir))
+    except FileNotFoundError:
+        logger.error('No games directory at %s', games_dir)
+        names = []
+
+    for name in names:
+        if not os.path.isdir(os.path.join(games_dir, name)):
+            continue
+        game = GameConfig(name)
+        try:
+            game.load()
+        except Exception:
+            logger.exception('Failed to load config for game %s', name)
+            continue
+        loaded[name] = game
+
+    # swap the whole registry at once so readers never see a partial load
+    global games
+    games = loaded
@@ -1,9 +1,9 @@
 import logging
 from typing import List, Optional
 
-import requests
-
 from . import config
+from .config import GameConfig
+from .tallier import add_timestamps
 
 logger = logging.getLogger(__name__)
 
@@ -11,29 +11,39 @@ logger = logging.getLogger(__name__)
 COMMENTS_URI_TEMPLATE = 'https://graph.facebook.com/v2.7/{post_id}/comments?fields=from{{name,picture{{url}}}},message,message_tags,created_time&limit=200&access_token={access_token}'
 MEMBERS_URI_TEMPLATE = 'https://graph.facebook.com/v2.2/{group_id}/members?fields=id,name,picture{{url}}&limit=200&access_token={access_token}'
 
-session = requests.Session()
+_session = None
+
+
+def get_session():
+    """Return the shared requests session, importing requests on first use."""
+    global _session
+    if _session is None:
+        import requests
 
+        _session = requests.Session()
+    return _session
 
-def fetch_comments() -> Optional[List[dict]]:
-    r = session.get(
+
+def fetch_comments(game: GameConfig) -> Optional[List[dict]]:
+    r = get_session().get(
         COMMENTS_URI_TEMPLATE.format(
-            access_token=config.get_access_token(), post_id=config.post_id
+            access_token=config.get_access_token(), post_id=game.post_id
         )
     )
     j = r.json()
     if 'data' in j:
-        return j['data']
-    logger.error('Error from Graph API: %s', j)
+        return add_timestamps(j['data'])
+    logger.error('Error from Graph API for game %s: %s', game.name, j)
 
 
-def fetch_members():
+def fetch_members(game: GameConfig):
     raise NotImplementedError
-    r = session.get(
+    r = get_session().get(
         MEMBERS_URI_TEMPLATE.format(
-            access_token=config.get_access_token(), group_id=config.group_id
+            access_token=config.get_access_token(), group_id=game.group_id
         )
     )
     j = r.json()
     if 'data' in j:
         return j['data']
-    logger.error('Error from Graph API: %s', j)
+    logger.error('Error from Graph API for game %s: %s', game.name, j)
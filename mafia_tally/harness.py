@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Differential test and timing harness for the tally engine.
+
+A case is a directory holding a recorded comment thread and the golden
+results the engine produced for it:
+
+- comments.json: the comments, in the same format manual_fetch.py outputs
+- game.json: a snapshot of the game config the thread was tallied with
+- golden.json: the tally state and the result of every parse_comment call
+- golden.txt: the text tally
+
+Usage:
+    python -m mafia_tally.harness record CASE GAME < comments.json
+    python -m mafia_tally.harness synth CASE [--players N] [--comments N]
+        [--seed N] [--majority N]
+    python -m mafia_tally.harness check [--engine MODULE:FUNCTION] [--repeat N]
+        CASE...
+
+check re-tallies each case, compares the results against the golden ones
+and reports how long parsing and textifying took. --engine names a function
+taking a GameConfig and returning a fresh tally, for checking a new engine
+against the current one.
+
+The cases under recordings/ are also checked by tests/test_harness.py.
+"""
+
+import argparse
+import copy
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, List, Tuple
+
+from mafia_tally import config
+from mafia_tally.config import GameConfig
+from mafia_tally.tallier import (
+    VotesTally,
+    VotingRules,
+    add_timestamps,
+    create_vote_tally,
+    tag_commenters,
+    textify_tally,
+)
+
+DEFAULT_ENGINE = 'mafia_tally.tallier:create_vote_tally'
+
+SYNTH_CUTOFF = 1500000000
+SYNTH_FIRST_NAMES = (
+    'Alice Bob Carol Dave Eve Frank Grace Heidi Ivan Judy Mallory Niaj Olivia '
+    'Peggy Rupert Sybil Trent Victor Walter Zoe'
+).split()
+SYNTH_LAST_NAMES = "Smith Jones Brown Taylor Wilson Nguyen Chen O'Brien Singh".split()
+
+
+def read_json(path: str):
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_json(path: str, obj):
+    with open(path, 'w') as f:
+        json.dump(obj, f, indent='\t', sort_keys=True)
+
+
+def snapshot_game(game: GameConfig, commenters: dict, now: float) -> dict:
+    return {
+        'day_id': game.day_id,
+        'cutoff': game.cutoff,
+        'players': sorted(game.players),
+        'rules': game.rules.to_json(),
+        'aliases': game.aliases,
+        'commenters': commenters,
+        'now': now,
+    }
+
+
+def restore_game(snapshot: dict) -> GameConfig:
+    game = GameConfig('harness')
+    game.day_id = snapshot['day_id']
+    game.cutoff = snapshot['cutoff']
+    game.players = set(snapshot['players'])
+    game.rules = VotingRules.from_json(snapshot['rules'])
+    game.aliases = snapshot['aliases']
+    game.pics = {}
+    return game
+
+
+def load_engine(name: str) -> Callable[[GameConfig], VotesTally]:
+    module, _, function = name.partition(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def run_case(
+    engine: Callable[[GameConfig], VotesTally], snapshot: dict, comments: List[dict]
+) -> Tuple[dict, str, float, float]:
+    """Tally a thread, returning the results and the parse and textify times."""
+    game = restore_game(snapshot)
+    comments = copy.deepcopy(comments)
+    tag_commenters(comments, snapshot['commenters'])
+
+    start = time.perf_counter()
+    add_timestamps(comments)
+    tally = engine(game)
+    results = [tally.parse_comment(comment) for comment in comments]
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    text = textify_tally(game, tally, now=snapshot['now'])
+    text_time = time.perf_counter() - start
+
+    return dump_tally(tally, results), text, parse_time, text_time
+
+
+def dump_tally(tally: VotesTally, results: list) -> dict:
+    return {
+        'votes': [[votee, voters] for votee, voters in tally.votes.items()],
+        'num_votes': {k: v for k, v in tally.num_votes.items() if v},
+        'voter_votes': tally.voter_votes,
+        'have_voted': sorted(tally.have_voted),
+        'abstaining': tally.abstaining,
+        'hammered': tally.hammered,
+        'hammer_comment': tally.hammer_comment and tally.hammer_comment['id'],
+        'comments': [
+            [is_vote, None if details is None else [repr(d) for d in details]]
+            for is_vote, details in results
+        ],
+    }
+
+
+def record_case(case: str, snapshot: dict, comments: List[dict]):
+    os.makedirs(case, exist_ok=True)
+    golden, text, _, _ = run_case(create_vote_tally, snapshot, comments)
+
+    write_json(os.path.join(case, 'comments.json'), comments)
+    write_json(os.path.join(case, 'game.json'), snapshot)
+    write_json(os.path.join(case, 'golden.json'), golden)
+    with open(os.path.join(case, 'golden.txt'), 'w') as f:
+        f.write(text)
+
+    print('Recorded', len(comments), 'comments to', case)
+
+
+def record(args):
+    game = config.get_games()[args.game]
+    with open(game.get_path('commenters.json')) as f:
+        commenters = json.load(f)
+    comments = json.load(sys.stdin)
+    record_case(args.case, snapshot_game(game, commenters, time.time()), comments)
+
+
+def synth_comments(rng: random.Random, players: List[str], count: int) -> List[dict]:
+    """Make up a thread with the kinds of votes people actually write."""
+    comments = []
+    # most of the thread is before the cutoff, but not all of it
+    timestamp = SYNTH_CUTOFF - count * 45
+
+    for i in range(count):
+        timestamp += rng.randint(1, 100)
+        voter = rng.choice(players)
+        votee = rng.choice(players)
+        tags = []
+        kind = rng.random()
+
+        if kind < 0.3:
+            message = 'Vote: ' + votee
+        elif kind < 0.4:
+            message = 'Vote: ' + votee
+            tags = [{'offset': 6, 'name': votee, 'id': str(players.index(votee))}]
+        elif kind < 0.5:
+            message = 'VOTE: ' + votee.split()[0].lower() + ' because reasons'
+        elif kind < 0.55:
+            # swap two letters
+            j = rng.randrange(len(votee) - 1)
+            message = 'Vote: ' + votee[:j] + votee[j + 1] + votee[j] + votee[j + 2 :]
+        elif kind < 0.6:
+            message = 'Vote: abstain'
+        elif kind < 0.62:
+            message = 'Vote: boss'
+        elif kind < 0.7:
+            message = 'Unvote: {}\nVote: {}'.format(rng.choice(players), votee)
+        elif kind < 0.75:
+            message = 'Unvote: ' + rng.choice(players)
+        else:
+            message = 'I think {} is suspicious.'.format(votee)
+
+        # the Graph API and arrow disagree on how to write offsets
+        offset = '+0000' if rng.random() < 0.5 else '+00:00'
+        created_time = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(timestamp))
+        comment = {
+            'id': str(i),
+            'from': {'name': voter},
+            'message': message,
+            'message_tags': tags,
+            'created_time': created_time + offset,
+        }
+        if rng.random() < 0.02:
+            del comment['from']
+        comments.append(comment)
+
+    return comments
+
+
+def synth(args):
+    rng = random.Random(args.seed)
+    names = [
+        first + ' ' + last for first in SYNTH_FIRST_NAMES for last in SYNTH_LAST_NAMES
+    ]
+    players = sorted(rng.sample(names, args.players))
+    comments = synth_comments(rng, players, args.comments)
+
+    cutoff = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(SYNTH_CUTOFF))
+    snapshot = {
+        'day_id': 1,
+        'cutoff': cutoff,
+        'players': players,
+        'rules': VotingRules(
+            weights={players[0]: 2},
+            unvotable={players[1]},
+            locked={players[2]},
+            majority=args.majority,
+        ).to_json(),
+        'aliases': {'Boss': players[3]},
+        'commenters': {
+            comment['id']: rng.choice(players)
+            for comment in comments
+            if 'from' not in comment and rng.random() < 0.5
+        },
+        'now': SYNTH_CUTOFF,
+    }
+    record_case(args.case, snapshot, comments)
+
+
+def check(args) -> int:
+    engine = load_engine(args.engine)
+    ok = True
+
+    for case in args.cases:
+        comments = read_json(os.path.join(case, 'comments.json'))
+        snapshot = read_json(os.path.join(case, 'game.json'))
+        golden = read_json(os.path.join(case, 'golden.json'))
+        with open(os.path.join(case, 'golden.txt')) as f:
+            golden_text = f.read()
+
+        parse_times = []
+        text_times = []
+        for _ in range(args.repeat):
+            result, text, parse_time, text_time = run_case(engine, snapshot, comments)
+            parse_times.append(parse_time)
+            text_times.append(text_time)
+
+        # round-trip through JSON so tuples and lists compare equal
+        result = json.loads(json.dumps(result))
+        mismatches = [key for key in golden if golden[key] != result.get(key)]
+        if text != golden_text:
+            mismatches.append('text')
+
+        if mismatches:
+            ok = False
+            status = 'MISMATCH in ' + ', '.join(mismatches)
+            # point at the first comment that came out differently
+            pairs = zip(golden['comments'], result['comments'])
+            for i, (expected, actual) in enumerate(pairs):
+                if expected != actual:
+                    print('  comment', i, 'expected', expected, 'got', actual)
+                    break
+        else:
+            status = 'ok'
+
+        parse_time = min(parse_times)
+        print(
+            '{0}: {1} comments, parse {2:.2f} ms ({3:.1f} µs/comment), '
+            'text {4:.2f} ms: {5}'.format(
+                case,
+                len(comments),
+                parse_time * 1e3,
+                parse_time / max(len(comments), 1) * 1e6,
+                min(text_times) * 1e3,
+                status,
+            )
+        )
+
+    return 0 if ok else 1
+
+
+def main() -> int:
+    # the text tally shows local times, so pin them down
+    os.environ['TZ'] = 'UTC'
+    time.tzset()
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    p = subparsers.add_parser('record', help='record a thread read from stdin')
+    p.add_argument('case')
+    p.add_argument('game')
+    p.set_defaults(func=record)
+
+    p = subparsers.add_parser('synth', help='record a synthetic thread')
+    p.add_argument('case')
+    p.add_argument('--players', type=int, default=15)
+    p.add_argument('--comments', type=int, default=300)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--majority', type=int)
+    p.set_defaults(func=synth)
+
+    p = subparsers.add_parser('check', help='check cases against their golden results')
+    p.add_argument('cases', nargs='+')
+    p.add_argument('--engine', default=DEFAULT_ENGINE)
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=check)
+
+    args = parser.parse_args()
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Check that the lightweight modules import quickly.
+
+Each module is imported in a fresh interpreter. The check fails if the
+import drags in any of the heavy web modules. Import times are measured
+under `-X importtime` and reported. Timings depend on the machine, so they
+are only held to a loose budget, which still catches the web stack being
+imported eagerly again (that used to cost around 300 ms).
+
+The same checks run as tests in tests/test_import_budget.py; the timing
+ones only with IMPORT_TIMING=1 set.
+"""
+
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BUDGET_US = 150000
+RUNS = 5
+
+MODULES = (
+    'mafia_tally',
+    'mafia_tally.config',
+    'mafia_tally.tallier',
+    'mafia_tally.cache',
+    'mafia_tally.fetcher',
+    'mafia_tally.manual_fetch',
+    'mafia_tally.harness',
+)
+HEAVY_MODULES = frozenset(
+    ('arrow', 'flask', 'jinja2', 'readline', 'requests', 'werkzeug')
+)
+
+repo_dir = os.path.join(os.path.dirname(__file__), '..')
+
+
+def parse_importtime(output: str) -> Dict[str, Tuple[int, int]]:
+    """Map each imported module name to its (indent, cumulative µs)."""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:') :].split('|')
+        if not cumulative.strip().isdigit():
+            # the header line
+            continue
+        indent = len(name) - len(name.lstrip())
+        times[name.strip()] = (indent, int(cumulative))
+    return times
+
+
+def heavy_imports(module: str) -> List[str]:
+    """Return the heavy modules in sys.modules after importing a module."""
+    proc = subprocess.run(
+        [
+            sys.executable,
+            '-c',
+            'import sys, {0}; print(*sorted(sys.modules), sep="\\n")'.format(module),
+        ],
+        cwd=repo_dir,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    return [
+        name
+        for name in proc.stdout.splitlines()
+        if name.split('.')[0] in HEAVY_MODULES
+    ]
+
+
+def measure(module: str) -> int:
+    """Return the time in µs taken to import a module in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        cwd=repo_dir,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    times = parse_importtime(proc.stderr)
+
+    # interpreter startup imports also show up at the top level, so only
+    # count our own package
+    return sum(
+        cumulative
+        for name, (indent, cumulative) in times.items()
+        if indent == 1 and name.split('.')[0] == 'mafia_tally'
+    )
+
+
+def best_time(module: str, runs: int = RUNS) -> int:
+    return min(measure(module) for _ in range(runs))
+
+
+def main() -> int:
+    ok = True
+
+    for module in MODULES:
+        elapsed = best_time(module)
+        heavy = heavy_imports(module)
+
+        status = 'ok'
+        if elapsed > BUDGET_US:
+            status = 'OVER BUDGET'
+            ok = False
+        if heavy:
+            status = 'IMPORTS ' + ', '.join(heavy)
+            ok = False
+
+        print('{0:<26} {1:>6} µs  {2}'.format(module, elapsed, status))
+
+    print('Budget: {} µs'.format(BUDGET_US))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,25 +2,25 @@
 
 import json
 import pprint
-import readline  # noqa
 import sys
 
 from mafia_tally import config
+from mafia_tally.config import GameConfig
 from mafia_tally.fetcher import fetch_comments
 
 
-def print_player_list():
-    for i, player in enumerate(sorted(config.players)):
+def print_player_list(game: GameConfig):
+    for i, player in enumerate(sorted(game.players)):
         print(i, player, sep='. ', file=sys.stderr)
 
 
-def input_player() -> str:
-    players = sorted(config.players)
+def input_player(game: GameConfig) -> str:
+    players = sorted(game.players)
 
     print('Pick a player: ', file=sys.stderr, end='')
     inp = input()
     while inp == '?':
-        print_player_list()
+        print_player_list(game)
         print('Pick a player: ', file=sys.stderr, end='')
         inp = input()
 
@@ -31,14 +31,17 @@ def input_player() -> str:
 
 
 def main():
-    print_player_list()
-    comments = fetch_comments()
+    import readline  # noqa
+
+    game = config.get_games()[sys.argv[1]]
+    print_player_list(game)
+    comments = fetch_comments(game)
 
     for i, comment in enumerate(comments):
         if 'from' not in comment:
             print('Comment', i, file=sys.stderr)
             pprint.pprint(comment, stream=sys.stderr)
-            player = input_player()
+            player = input_player(game)
             comment['from'] = {'name': player}
             print(file=sys.stderr)
 
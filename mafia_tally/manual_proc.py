@@ -3,20 +3,24 @@
 import json
 import sys
 
-from mafia_tally import app, cache
+from mafia_tally import cache, config, create_app
+from mafia_tally.tallier import add_timestamps
 from mafia_tally.tally import create_vote_tally, make_html_tally, textify_tally
 
 
 def main():
-    comments = json.load(sys.stdin)
-    tally = create_vote_tally()
+    game = config.get_games()[sys.argv[1]]
+    comments = add_timestamps(json.load(sys.stdin))
+    tally = create_vote_tally(game)
 
-    with app.app_context():
-        page = make_html_tally(tally, comments)
-    text = textify_tally(tally)
+    with create_app().app_context():
+        page = make_html_tally(game, tally, comments)
+    text = textify_tally(game, tally)
     print(text)
-    cache.write_day_text(text)
-    cache.write_day_html(page)
+    cache.write_day_text(game, text)
+    cache.write_day_html(game, page)
+    if tally.final:
+        cache.finalise_day(game)
 
 
 if __name__ == "__main__":
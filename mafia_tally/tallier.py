@@ -1,7 +1,25 @@
+import calendar
 import collections
+import datetime
 import enum
 import re
-from typing import AbstractSet, Dict, List, Mapping, Optional, Set, Tuple
+import time
+from io import StringIO
+from typing import (
+    TYPE_CHECKING,
+    AbstractSet,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from .config import GameConfig
 
 __all__ = ('VotesTally',)
 
@@ -10,12 +28,67 @@ ABSTAIN = 'ABSTAIN'
 
 find_vote_re = re.compile(r'^V(?:OTE|ote):\s+', re.MULTILINE)
 find_unvote_re = re.compile(r'^U(?:NVOTE|nvote):\s+', re.MULTILINE)
+find_words_re = re.compile(r'\w+')
+iso_timestamp_re = re.compile(
+    r'^(\d{4}-\d\d-\d\d)(?:[T ](\d\d):(\d\d)(?::(\d\d)(?:\.\d+)?)?)?'
+    r'\s*(Z|[+-]\d\d(?::?\d\d)?)?$'
+)
 
 find_vote = find_vote_re.search
 find_unvote = find_unvote_re.search
 
 str_list = ', '.join
 
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+
+
+def parse_timestamp(timestamp: str) -> int:
+    """
+    Convert a Graph API timestamp to a Unix timestamp.
+
+    These are always like 2017-01-01T00:00:00+0000, which strptime handles
+    quickly; anything else falls back to parse_iso_timestamp.
+    """
+    try:
+        dt = datetime.datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except ValueError:
+        return parse_iso_timestamp(timestamp)
+    return int(dt.timestamp())
+
+
+def parse_iso_timestamp(timestamp: str) -> int:
+    """
+    Leniently convert an ISO 8601 timestamp to a Unix timestamp.
+
+    Like arrow.get, this accepts a space instead of the T, missing seconds,
+    fractional seconds (which are dropped), offsets with or without a colon,
+    and no offset at all, meaning UTC.
+    """
+    match = iso_timestamp_re.match(timestamp.strip())
+    if not match:
+        raise ValueError('Invalid timestamp: {!r}'.format(timestamp))
+    date, hour, minute, second, offset = match.groups()
+
+    dt = datetime.datetime.strptime(date, '%Y-%m-%d').replace(
+        hour=int(hour or 0), minute=int(minute or 0), second=int(second or 0)
+    )
+    seconds = calendar.timegm(dt.timetuple())
+
+    if offset and offset != 'Z':
+        sign = -1 if offset[0] == '-' else 1
+        digits = offset[1:].replace(':', '')
+        offset_minutes = int(digits[:2]) * 60 + int(digits[2:] or 0)
+        seconds -= sign * offset_minutes * 60
+
+    return seconds
+
+
+def add_timestamps(comments: List[dict]) -> List[dict]:
+    """Store each comment's created_time as a Unix timestamp in created_ts."""
+    for comment in comments:
+        comment['created_ts'] = parse_timestamp(comment['created_time'])
+    return comments
+
 
 class VoteInfo(object):
     class Type(enum.IntEnum):
@@ -26,17 +99,299 @@ class VoteInfo(object):
         HASNT_VOTED = 4
         UNVOTING_OTHER = 5
         UNKNOWN_VOTER = 6
+        VOTE_LOCKED = 7
+        FUZZY_VOTEE = 8
+        HAMMER = 9
 
-    __slots__ = ('type', 'votee')
+    __slots__ = ('type', 'votee', 'confidence', 'candidates')
 
-    def __init__(self, t: Type, votee: str = None) -> None:
+    def __init__(
+        self,
+        t: Type,
+        votee: str = None,
+        confidence: float = None,
+        candidates: Tuple[str, ...] = (),
+    ) -> None:
         self.type = t
         self.votee = votee
+        self.confidence = confidence
+        # everyone an ambiguous vote could have been for
+        self.candidates = candidates
 
     def __repr__(self) -> str:
-        if self.votee is None:
-            return 'VoteInfo({})'.format(self.type.name)
-        return 'VoteInfo({}, {!r})'.format(self.type.name, self.votee)
+        args = [self.type.name]
+        if self.votee is not None:
+            args.append(repr(self.votee))
+        if self.candidates:
+            args.append(repr(self.candidates))
+        if self.confidence is not None:
+            args.append('{:.2f}'.format(self.confidence))
+        return 'VoteInfo({})'.format(', '.join(args))
+
+
+VoteeResult = Tuple[Optional[str], Optional[VoteInfo]]
+
+
+def find_words(text: str) -> List[str]:
+    return find_words_re.findall(text)
+
+
+def bigrams(word: str) -> Set[str]:
+    padded = '^' + word + '$'
+    return {padded[i : i + 2] for i in range(len(padded) - 1)}
+
+
+def max_typos(word: str) -> int:
+    """How many typos to tolerate when fuzzy matching against a word."""
+    if len(word) <= 3:
+        return 0
+    if len(word) <= 7:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Damerau-Levenshtein (optimal string alignment) distance."""
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                d = min(d, prev2[j - 2] + 1)
+            cur.append(d)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class VoteeIndex(object):
+    """
+    Precomputed lookups for working out who an untagged vote is for.
+
+    Votees are resolved by, in order:
+    - a case-insensitive prefix match on a full name,
+    - an exact match on a full name, alias, or a single word of a name
+      (e.g. a first name), which may be ambiguous. A single word may just be
+      the start of the sentence, so it's only WORD_CONFIDENCE sure,
+    - a fuzzy match on any of those, tolerating a typo or two. Guesses less
+      than MIN_CONFIDENCE sure are reported, but not counted.
+
+    Every player is indexed, votable or not, so that a vote for an unvotable
+    player is reported as such rather than matched to somebody else.
+
+    Everything that doesn't depend on the message is computed up front, and
+    results are memoised on the words of the vote, since the same few
+    spellings tend to show up over and over in a thread.
+    """
+
+    MEMO_SIZE = 4096
+    MIN_CONFIDENCE = 0.8
+    WORD_CONFIDENCE = 0.9
+    # shorter words of names (e.g. the O in O'Brien) match too much by accident
+    MIN_WORD_LENGTH = 3
+
+    def __init__(
+        self, players: AbstractSet[str], aliases: Mapping[str, str] = None
+    ) -> None:
+        # full names bucketed by their first character
+        self.prefixes: Dict[str, List[Tuple[str, str]]] = collections.defaultdict(list)
+        # normalised name/alias/word -> players
+        self.keys: Dict[str, Set[str]] = collections.defaultdict(set)
+        # keys that are only a single word of a name
+        self.word_keys: Set[str] = set()
+
+        for name in players:
+            lower = name.lower()
+            self.prefixes[lower[:1]].append((lower, name))
+            for word in find_words(lower):
+                if len(word) >= self.MIN_WORD_LENGTH:
+                    self.keys[word].add(name)
+                    self.word_keys.add(word)
+
+        # full names and aliases trump single words of other names
+        for name in players:
+            self.set_full_key(name, name)
+        for alias, name in (aliases or {}).items():
+            if name in players:
+                self.set_full_key(alias, name)
+
+        self.keys.pop('', None)
+        self.max_words = max((key.count(' ') + 1 for key in self.keys), default=0)
+
+        self.bigram_keys: Dict[str, Set[str]] = collections.defaultdict(set)
+        for key in self.keys:
+            if max_typos(key):
+                for bigram in bigrams(key):
+                    self.bigram_keys[bigram].add(key)
+
+        self.memo: Dict[Tuple[str, ...], VoteeResult] = {}
+
+    def set_full_key(self, text: str, name: str):
+        key = ' '.join(find_words(text.lower()))
+        self.keys[key] = {name}
+        self.word_keys.discard(key)
+
+    def lookup(self, stuff: str) -> VoteeResult:
+        """Resolve the lowercased text following a vote to a votee."""
+        possible = [
+            name
+            for lower, name in self.prefixes.get(stuff[:1], ())
+            if stuff.startswith(lower)
+        ]
+        if len(possible) == 1:
+            return possible[0], None
+        if possible:
+            # This should never happen.
+            votee = max(possible, key=len)
+            return votee, VoteInfo(
+                VoteInfo.Type.MULTIPLE_POSSIBLE_VOTEE,
+                votee,
+                candidates=tuple(sorted(possible)),
+            )
+
+        words = tuple(find_words(stuff.split('\n', 1)[0])[: self.max_words])
+        try:
+            return self.memo[words]
+        except KeyError:
+            pass
+
+        result = self.lookup_words(words)
+        if len(self.memo) >= self.MEMO_SIZE:
+            self.memo.clear()
+        self.memo[words] = result
+        return result
+
+    def lookup_words(self, words: Tuple[str, ...]) -> VoteeResult:
+        # try the longest run of words first, so 'bob jones' beats 'bob'
+        queries = [' '.join(words[:n]) for n in range(len(words), 0, -1)]
+
+        for query in queries:
+            players = self.keys.get(query)
+            if players:
+                confidence = self.WORD_CONFIDENCE if query in self.word_keys else 1.0
+                return self.pick(dict.fromkeys(players, confidence))
+
+        scores: Dict[str, float] = {}
+        for query in queries:
+            for key in self.fuzzy_candidates(query):
+                typos = max_typos(key)
+                if abs(len(key) - len(query)) > typos:
+                    continue
+                distance = edit_distance(query, key)
+                if distance > typos:
+                    continue
+                confidence = 1 - distance / max(len(key), len(query))
+                for player in self.keys[key]:
+                    if confidence > scores.get(player, 0):
+                        scores[player] = confidence
+
+        if not scores:
+            return None, VoteInfo(VoteInfo.Type.UNKNOWN_VOTEE)
+        return self.pick(scores)
+
+    def fuzzy_candidates(self, query: str) -> Set[str]:
+        candidates: Set[str] = set()
+        for bigram in bigrams(query):
+            candidates.update(self.bigram_keys.get(bigram, ()))
+        return candidates
+
+    @classmethod
+    def pick(cls, scores: Mapping[str, float]) -> VoteeResult:
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+        votee, confidence = ranked[0]
+
+        if confidence < cls.MIN_CONFIDENCE:
+            # too much of a stretch to count, but say who it might be
+            return None, VoteInfo(VoteInfo.Type.UNKNOWN_VOTEE, votee, confidence)
+        if len(ranked) > 1 and ranked[1][1] == confidence:
+            # can't tell who they meant, so leave it to the mods
+            candidates = tuple(name for name, score in ranked if score == confidence)
+            return None, VoteInfo(
+                VoteInfo.Type.MULTIPLE_POSSIBLE_VOTEE,
+                confidence=confidence,
+                candidates=candidates,
+            )
+        if confidence < 1:
+            return votee, VoteInfo(VoteInfo.Type.FUZZY_VOTEE, votee, confidence)
+        return votee, None
+
+
+class CompiledRules(NamedTuple):
+    voting: AbstractSet[str]
+    votables: AbstractSet[str]
+    weights: Mapping[str, int]
+    locked: AbstractSet[str]
+    index: VoteeIndex
+    majority: Optional[int]
+
+
+class VotingRules(object):
+    """
+    Per-day voting rules.
+
+    - weights: how many votes each player's vote counts for (default 1).
+      Double voters have a weight of 2; players with a weight of 0 can't vote.
+    - unvotable: players who can't be voted for.
+    - locked: players who can't change their vote once they've voted.
+    - majority: the number of votes that ends the day as soon as a votee
+      reaches it (a hammer), or None to run the day to the cutoff.
+    """
+
+    __slots__ = ('weights', 'unvotable', 'locked', 'majority')
+
+    def __init__(
+        self,
+        weights: Mapping[str, int] = None,
+        unvotable: Iterable[str] = (),
+        locked: Iterable[str] = (),
+        majority: int = None,
+    ) -> None:
+        self.weights = dict(weights or {})
+        self.unvotable = set(unvotable)
+        self.locked = set(locked)
+        self.majority = majority
+
+    @classmethod
+    def from_json(cls, rules: dict) -> 'VotingRules':
+        return cls(
+            weights=rules.get('weights'),
+            unvotable=rules.get('unvotable', ()),
+            locked=rules.get('locked', ()),
+            majority=rules.get('majority'),
+        )
+
+    def to_json(self) -> dict:
+        return {
+            'weights': self.weights,
+            'unvotable': sorted(self.unvotable),
+            'locked': sorted(self.locked),
+            'majority': self.majority,
+        }
+
+    def compile(
+        self, players: AbstractSet[str], aliases: Mapping[str, str] = None
+    ) -> CompiledRules:
+        """
+        Compile the rules into lookup tables for the given players.
+
+        This is done once per config change, so that VotesTally only needs
+        set and dict lookups per vote.
+        """
+        weights = {
+            player: weight
+            for player, weight in self.weights.items()
+            if player in players and weight != 1
+        }
+        votables = frozenset(players - self.unvotable)
+        return CompiledRules(
+            voting=frozenset(p for p in players if weights.get(p, 1) != 0),
+            votables=votables,
+            weights=weights,
+            locked=frozenset(players & self.locked),
+            index=VoteeIndex(players, aliases),
+            majority=self.majority,
+        )
 
 
 class VotesTally(object):
@@ -47,15 +402,23 @@ class VotesTally(object):
     abstaining: List[str]
     voting: AbstractSet[str]
     votables: AbstractSet[str]
-    cutoff: str
+    cutoff: int
     vote_weights: Mapping[str, int]
+    locked: AbstractSet[str]
+    index: VoteeIndex
+    majority: Optional[int]
+    hammered: Optional[str]
+    hammer_comment: Optional[dict]
 
     def __init__(
         self,
         voting: AbstractSet[str],
         votables: AbstractSet[str],
-        cutoff: str,
+        cutoff: int,
         weights: Mapping[str, int] = None,
+        locked: AbstractSet[str] = frozenset(),
+        index: VoteeIndex = None,
+        majority: int = None,
     ) -> None:
         self.votes = collections.OrderedDict()
         self.num_votes = collections.defaultdict(int)
@@ -66,12 +429,31 @@ class VotesTally(object):
         self.votables = votables
         self.cutoff = cutoff
         self.vote_weights = weights or {}
+        self.locked = locked
+        self.index = index or VoteeIndex(votables)
+        self.majority = majority
+        self.hammered = None
+        self.hammer_comment = None
+
+    @classmethod
+    def from_rules(cls, rules: CompiledRules, cutoff: int) -> 'VotesTally':
+        return cls(
+            voting=rules.voting,
+            votables=rules.votables,
+            cutoff=cutoff,
+            weights=rules.weights,
+            locked=rules.locked,
+            index=rules.index,
+            majority=rules.majority,
+        )
 
     def parse_comment(self, comment: dict) -> Tuple[bool, Optional[List[VoteInfo]]]:
-        timestamp: str = comment['created_time']
+        timestamp = comment.get('created_ts')
+        if timestamp is None:
+            timestamp = parse_timestamp(comment['created_time'])
         message: str = comment['message']
 
-        if timestamp >= self.cutoff:
+        if timestamp >= self.cutoff or self.hammered is not None:
             return False, None
 
         voter: str = comment.get('from', {}).get('name')
@@ -108,7 +490,9 @@ class VotesTally(object):
                 all_errs.append(err)
             if votee:
                 if voter is not None:
-                    ok, errs = self.do_vote(voter, votee)
+                    # don't end the day on a guess at who they meant
+                    guessed = err is not None and err.type == VoteInfo.Type.FUZZY_VOTEE
+                    ok, errs = self.do_vote(voter, votee, can_hammer=not guessed)
                 else:
                     # HACK
                     ok = True
@@ -119,6 +503,9 @@ class VotesTally(object):
                 is_vote = is_vote or ok
                 all_errs += errs
 
+                if self.hammered is not None:
+                    self.hammer_comment = comment
+
         return is_vote, all_errs
 
     def get_votee(
@@ -131,18 +518,11 @@ class VotesTally(object):
         if stuff.startswith('abstain'):
             return ABSTAIN, None
 
-        possible = [name for name in self.votables if stuff.startswith(name.lower())]
-        if not possible:
-            return None, VoteInfo(VoteInfo.Type.UNKNOWN_VOTEE)
-
-        if len(possible) != 1:
-            # This should never happen.
-            votee = max(possible, key=len)
-            return votee, VoteInfo(VoteInfo.Type.MULTIPLE_POSSIBLE_VOTEE, votee)
+        return self.index.lookup(stuff)
 
-        return possible[0], None
-
-    def do_vote(self, voter: str, votee: str) -> Tuple[bool, List[VoteInfo]]:
+    def do_vote(
+        self, voter: str, votee: str, can_hammer: bool = True
+    ) -> Tuple[bool, List[VoteInfo]]:
         # votee = real_name_map.get(votee, votee)
         votes = self.votes
         voter_votes = self.voter_votes
@@ -150,6 +530,9 @@ class VotesTally(object):
         err = []
 
         if voter in voter_votes:
+            if voter in self.locked:
+                err.append(VoteInfo(VoteInfo.Type.VOTE_LOCKED, voter_votes[voter]))
+                return False, err
             err.append(VoteInfo(VoteInfo.Type.DIDNT_UNVOTE, voter_votes[voter]))
             self.do_unvote(voter, votee=None)
 
@@ -167,6 +550,10 @@ class VotesTally(object):
         self.num_votes[votee] += self.vote_weights.get(voter, 1)
         voter_votes[voter] = votee
 
+        if can_hammer and self.majority and self.num_votes[votee] >= self.majority:
+            self.hammered = votee
+            err.append(VoteInfo(VoteInfo.Type.HAMMER, votee))
+
         return True, err
 
     def do_unvote(
@@ -184,6 +571,9 @@ class VotesTally(object):
             if current_vote != votee:
                 return False, VoteInfo(VoteInfo.Type.UNVOTING_OTHER, current_vote)
 
+        if voter in self.locked:
+            return False, VoteInfo(VoteInfo.Type.VOTE_LOCKED, current_vote)
+
         if current_vote == ABSTAIN:
             self.unabstain(voter)
         else:
@@ -197,6 +587,11 @@ class VotesTally(object):
 
         return True, None
 
+    @property
+    def final(self) -> bool:
+        """Whether the day ended early because somebody was hammered."""
+        return self.hammer_comment is not None
+
     def unabstain(self, voter: str):
         voter_votes = self.voter_votes
 
@@ -249,3 +644,45 @@ class VotesTally(object):
 
 def list_display_count(it: list) -> str:
     return '{0} ({1})'.format(len(it), str_list(it))
+
+
+def format_local_time(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp).astimezone().isoformat()
+
+
+def create_vote_tally(game: 'GameConfig') -> VotesTally:
+    return VotesTally.from_rules(game.get_compiled_rules(), cutoff=game.cutoff_ts)
+
+
+def textify_tally(game: 'GameConfig', tally: VotesTally, now: float = None) -> str:
+    if now is None:
+        now = time.time()
+    s = StringIO()
+
+    tally.display_votes(file=s)
+    s.write('\n')
+
+    tally.print_abstaining(file=s)
+    tally.print_unvoted(file=s)
+    tally.print_did_not_vote(file=s)
+
+    print('\nLast updated:', format_local_time(now), file=s)
+
+    if tally.final:
+        voter = tally.hammer_comment['from']['name']
+        print(tally.hammered, 'was hammered by', voter + '.', file=s)
+    elif now >= game.cutoff_ts:
+        if tally.votes:
+            lynched = max(tally.votes, key=tally.num_votes.get)
+            print(lynched, 'was lynched (probably).', file=s)
+        else:
+            print('Nobody was voted for lynching at the end of the day. Boo.', file=s)
+
+    return s.getvalue()
+
+
+def tag_commenters(comments: List[dict], commenters: Dict[str, str]):
+    """Fill in the commenter of comments the Graph API didn't give one for."""
+    for comment in comments:
+        if 'from' not in comment and comment['id'] in commenters:
+            comment['from'] = {'name': commenters[comment['id']]}
@@ -1,5 +1,4 @@
 import json
-from io import StringIO
 from typing import List, Optional, Tuple, Union
 
 import arrow
@@ -7,6 +6,7 @@ from flask import (
     Blueprint,
     Response,
     abort,
+    g,
     render_template,
     send_from_directory,
     url_for,
@@ -14,8 +14,15 @@ from flask import (
 from jinja2 import Markup, escape
 
 from . import cache, config
+from .config import GameConfig
 from .fetcher import fetch_comments
-from .tallier import VoteInfo, VotesTally
+from .tallier import (
+    VoteInfo,
+    VotesTally,
+    create_vote_tally,
+    tag_commenters,
+    textify_tally,
+)
 
 HTML_HEADER = """\
 <!DOCTYPE html>
@@ -36,55 +43,47 @@ HTML_FOOTER = """
 TEXT_MIME_TYPE = 'text/plain; charset=utf-8'
 
 
-bp = Blueprint('tally', __name__)
+bp = Blueprint('tally', __name__, url_prefix='/<game>')
 html_header = lambda title: HTML_HEADER.format(
     title=title, css=url_for('static', filename='style.css')
 )
 wrap_page = lambda title, page: html_header(title) + page + HTML_FOOTER
 
 
-def create_vote_tally() -> VotesTally:
-    return VotesTally(
-        voting=config.players, votables=config.players, cutoff=config.cutoff
-    )
-
-
-def textify_tally(tally: VotesTally) -> str:
-    now = arrow.now()
-    s = StringIO()
+@bp.url_value_preprocessor
+def pull_game(endpoint: str, values: dict):
+    g.game = config.get_game(values.pop('game'))
+    if g.game is None:
+        abort(404)
 
-    tally.display_votes(file=s)
-    s.write('\n')
 
-    tally.print_abstaining(file=s)
-    tally.print_unvoted(file=s)
-    tally.print_did_not_vote(file=s)
+def refresh_day(game: GameConfig) -> Tuple[str, str]:
+    """
+    Fetch the current day's comments, then render and cache both tallies.
 
-    print('\nLast updated:', now, file=s)
+    If somebody was hammered, the day is finalised, freezing its cache.
+    """
+    comments = fetch_comments(game)
+    tally = create_vote_tally(game)
+    page = make_html_tally(game, tally, comments)
+    day_text = textify_tally(game, tally)
 
-    if now >= arrow.get(config.cutoff):
-        if tally.votes:
-            lynched = max(tally.votes, key=tally.num_votes.get)
-            print(lynched, 'was lynched (probably).', file=s)
-        else:
-            print('Nobody was voted for lynching at the end of the day. Boo.', file=s)
+    cache.write_day_text(game, day_text)
+    cache.write_day_html(game, page)
+    if tally.final:
+        cache.finalise_day(game)
 
-    return s.getvalue()
+    return day_text, page
 
 
 @bp.route('/text')
 def text():
-    if cache.day_text_is_stale():
-        comments = fetch_comments()
-        tally = create_vote_tally()
-
-        for comment in comments:
-            tally.parse_comment(comment)
-
-        day_text = textify_tally(tally)
-        cache.write_day_text(day_text)
-    else:
-        day_text = cache.read_day_text()
+    game: GameConfig = g.game
+    with cache.refresh_lock(game):
+        if cache.day_text_is_stale(game):
+            day_text, _ = refresh_day(game)
+        else:
+            day_text = cache.read_day_text(game)
 
     return day_text, {'Content-Type': TEXT_MIME_TYPE}
 
@@ -92,23 +91,22 @@ def text():
 @bp.route('/<int:day_id>.txt')
 def day_text(day_id: int):
     try:
-        return send_from_directory(cache.cache_dir, '%d.txt' % day_id)
+        return send_from_directory(cache.get_dir(g.game), '%d.txt' % day_id)
     except FileNotFoundError:
         abort(404)
 
 
-def make_html_tally(tally: VotesTally, comments: List[dict]) -> str:
+def make_html_tally(game: GameConfig, tally: VotesTally, comments: List[dict]) -> str:
     num_skipped = 0
     comment_details: List[Tuple[Optional[dict], Union[int, List[VoteInfo], None]]] = []
-    with open(config.get_path('commenters.json')) as f:
-        commenters = json.load(f)
+    with open(game.get_path('commenters.json')) as f:
+        tag_commenters(comments, json.load(f))
 
     for comment in comments:
-        if 'from' not in comment and comment['id'] in commenters:
-            comment['from'] = {'name': commenters[comment['id']]}
-
         is_vote, details = tally.parse_comment(comment)
-        if is_vote:
+        # show uncounted guesses too, so the mods can sort them out
+        is_guess = any(detail.confidence is not None for detail in details or ())
+        if is_vote or is_guess:
             if num_skipped:
                 comment_details.append((None, num_skipped))
                 num_skipped = 0
@@ -123,7 +121,7 @@ def make_html_tally(tally: VotesTally, comments: List[dict]) -> str:
         for comment in comments
         if 'picture' in comment.get('from', {})
     }
-    pictures.update(config.pics)
+    pictures.update(game.pics)
 
     for comment in comments:
         for tag in comment.get('message_tags', ()):
@@ -135,7 +133,7 @@ def make_html_tally(tally: VotesTally, comments: List[dict]) -> str:
         now=arrow.now(),
         tally=tally,
         votes=votes,
-        config=config,
+        config=game,
         comments=comment_details,
         pictures=pictures,
         VoteInfoType=VoteInfo.Type,
@@ -144,34 +142,31 @@ def make_html_tally(tally: VotesTally, comments: List[dict]) -> str:
 
 @bp.route('/')
 def index():
-    title = 'Day %d Votes' % config.day_id
-    if cache.day_html_is_stale():
-        comments = fetch_comments()
-        tally = create_vote_tally()
-        page = make_html_tally(tally, comments)
-
-        cache.write_day_text(textify_tally(tally))
-        cache.write_day_html(page)
-
-        return wrap_page(title, page)
-    else:
-        return wrap_page(title, cache.read_day_html())
+    game: GameConfig = g.game
+    title = 'Day %d Votes' % game.day_id
+    with cache.refresh_lock(game):
+        if cache.day_html_is_stale(game):
+            _, page = refresh_day(game)
+            return wrap_page(title, page)
+        else:
+            return wrap_page(title, cache.read_day_html(game))
 
 
 @bp.route('/<int:day_id>')
 def day_page(day_id: int):
     try:
-        return wrap_page('Day %d Votes' % day_id, cache.read_cache('%d.html' % day_id))
+        page = cache.read_cache(g.game, '%d.html' % day_id)
     except FileNotFoundError:
         abort(404)
+    return wrap_page('Day %d Votes' % day_id, page)
 
 
-def generate_all(header: str):
+def generate_all(game: GameConfig, header: str):
     # header needs to be created whilst we still have a route context
     yield header
-    for day in range(1, config.day_id + 1):
+    for day in range(1, game.day_id + 1):
         try:
-            yield cache.read_cache('%d.html' % day)
+            yield cache.read_cache(game, '%d.html' % day)
         except FileNotFoundError:
             pass
     yield HTML_FOOTER
@@ -179,7 +174,7 @@ def generate_all(header: str):
 
 @bp.route('/all')
 def all_tallies():
-    return Response(generate_all(html_header('All tallies')))
+    return Response(generate_all(g.game, html_header('All tallies')))
 
 
 @bp.app_template_filter()
@@ -0,0 +1,37 @@
+import glob
+import json
+import os
+import time
+
+import pytest
+
+from mafia_tally import harness
+
+recordings_dir = os.path.join(os.path.dirname(__file__), '..', 'recordings')
+cases = sorted(glob.glob(os.path.join(recordings_dir, '*', '')))
+
+
+@pytest.fixture
+def utc(monkeypatch):
+    # the text tally shows local times, so pin them down like the harness does
+    monkeypatch.setenv('TZ', 'UTC')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.parametrize('case', cases, ids=lambda case: os.path.basename(case[:-1]))
+def test_golden(case, utc):
+    comments = harness.read_json(os.path.join(case, 'comments.json'))
+    snapshot = harness.read_json(os.path.join(case, 'game.json'))
+    golden = harness.read_json(os.path.join(case, 'golden.json'))
+    with open(os.path.join(case, 'golden.txt')) as f:
+        golden_text = f.read()
+
+    engine = harness.load_engine(harness.DEFAULT_ENGINE)
+    result, text, _, _ = harness.run_case(engine, snapshot, comments)
+
+    # round-trip through JSON so tuples and lists compare equal
+    assert json.loads(json.dumps(result)) == golden
+    assert text == golden_text
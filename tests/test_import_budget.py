@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+from mafia_tally import import_budget
+
+
+@pytest.mark.parametrize('module', import_budget.MODULES)
+def test_no_heavy_imports(module):
+    assert import_budget.heavy_imports(module) == []
+
+
+# timings depend on the machine and its load, so only check them when asked
+@pytest.mark.skipif(
+    not os.environ.get('IMPORT_TIMING'), reason='set IMPORT_TIMING=1 to check'
+)
+@pytest.mark.parametrize('module', import_budget.MODULES)
+def test_import_time(module):
+    assert import_budget.best_time(module, runs=3) < import_budget.BUDGET_US
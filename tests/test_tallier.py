@@ -0,0 +1,58 @@
+from mafia_tally.tallier import VoteInfo, VotesTally, VotingRules
+
+
+def make_tally(players, **rules) -> VotesTally:
+    compiled = VotingRules(**rules).compile(frozenset(players))
+    return VotesTally.from_rules(compiled, cutoff=2 ** 31)
+
+
+def vote(tally: VotesTally, voter: str, message: str):
+    return tally.parse_comment(
+        {'from': {'name': voter}, 'message': message, 'created_ts': 0}
+    )
+
+
+def test_untagged_vote_for_unvotable_player():
+    tally = make_tally(
+        {'Dave Singh', 'Dave Smith', 'Ann Lee'}, unvotable={'Dave Singh'}
+    )
+    is_vote, details = vote(tally, 'Ann Lee', 'Vote: Dave Singh')
+
+    assert not is_vote
+    assert [(d.type, d.votee) for d in details] == [
+        (VoteInfo.Type.UNVOTABLE, 'Dave Singh')
+    ]
+    assert not any(tally.num_votes.values())
+
+
+def test_single_word_vote_is_a_guess():
+    tally = make_tally({'Will Turner', 'Ann Lee'}, majority=1)
+    is_vote, details = vote(tally, 'Ann Lee', 'Vote: will decide later')
+
+    assert is_vote
+    [detail] = details
+    assert detail.type == VoteInfo.Type.FUZZY_VOTEE
+    assert detail.votee == 'Will Turner'
+    assert detail.confidence < 1
+    # a guess can't end the day
+    assert tally.hammered is None
+
+
+def test_full_name_vote_is_not_a_guess():
+    tally = make_tally({'Will Turner', 'Ann Lee'}, majority=1)
+    is_vote, details = vote(tally, 'Ann Lee', 'Vote: will turner')
+
+    assert is_vote
+    assert [d.type for d in details] == [VoteInfo.Type.HAMMER]
+    assert tally.hammered == 'Will Turner'
+
+
+def test_ambiguous_vote_lists_every_candidate():
+    tally = make_tally({'Bobby Smith', 'Dave Smith', 'Ann Lee'})
+    is_vote, details = vote(tally, 'Ann Lee', 'Vote: smith')
+
+    assert not is_vote
+    [detail] = details
+    assert detail.type == VoteInfo.Type.MULTIPLE_POSSIBLE_VOTEE
+    assert detail.votee is None
+    assert detail.candidates == ('Bobby Smith', 'Dave Smith')
@@ -0,0 +1,36 @@
+import pytest
+
+from mafia_tally.tallier import parse_iso_timestamp, parse_timestamp
+
+# 2017-01-01T12:34:56Z
+NOON = 1483274096
+
+
+@pytest.mark.parametrize(
+    'timestamp, expected',
+    [
+        ('2017-01-01T12:34:56+0000', NOON),
+        ('2017-01-01T12:34:56+00:00', NOON),
+        ('2017-01-01T12:34:56Z', NOON),
+        ('2017-01-01 12:34:56+00:00', NOON),
+        ('2017-01-01T12:34:56', NOON),
+        ('2017-01-01T12:34:56.789+00:00', NOON),
+        ('2017-01-01T12:34+00:00', NOON - 56),
+        ('2017-01-01', NOON - 45296),
+        ('2017-01-01T22:34:56+10:00', NOON),
+        ('2017-01-01T02:04:56-1030', NOON),
+        ('2017-01-01T14:34:56+02', NOON),
+        (' 2017-01-01T12:34:56Z\n', NOON),
+    ],
+)
+def test_parse_iso_timestamp(timestamp, expected):
+    assert parse_iso_timestamp(timestamp) == expected
+    assert parse_timestamp(timestamp) == expected
+
+
+@pytest.mark.parametrize(
+    'timestamp', ['', 'tomorrow', '2017-01-01T12', '2017-13-01', '01/01/2017']
+)
+def test_parse_iso_timestamp_invalid(timestamp):
+    with pytest.raises(ValueError):
+        parse_iso_timestamp(timestamp)